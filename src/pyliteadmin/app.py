@@ -1,4 +1,5 @@
-import os
+import argparse
+from pathlib import Path
 from abc import ABC, abstractmethod
 from itertools import cycle
 from typing import Optional
@@ -28,13 +29,31 @@ keys: dict[int, list] = {}
 # Dict of columns and  their related column values for currently viewed table  
 column_keys: dict[str, str] = {}
 
-# Take command line argument for the path to the database
-# If no command line argument is given, return error and exit
-if len(os.sys.argv) > 1:
-    db_path = os.sys.argv[1]
-else:
-    print("No database path given.\nUSAGE: pyliteadmin.py <path to database>")
-    exit()
+# Take command line arguments for the paths to the databases and the launch mode
+# If no database path is given, argparse prints the usage and exits
+parser = argparse.ArgumentParser(prog="pyliteadmin", description="A TUI for CRUDing sqlite databases.")
+parser.add_argument(
+    "db_paths", nargs="+", metavar="db_path",
+    help="path to a database; every database after the first is attached to the same session")
+parser.add_argument(
+    "--read-only", action="store_true",
+    help="open the database read-only and disable all edit actions")
+parser.add_argument(
+    "--snapshot", action="store_true",
+    help="like --read-only, but treat the file as an immutable copy that nothing else writes to")
+args = parser.parse_args()
+
+db_paths = args.db_paths
+snapshot = args.snapshot
+read_only = args.read_only or snapshot
+
+# Every database after the first is attached, so stay within sqlite's limit
+if len(db_paths) - 1 > db.max_attached():
+    parser.error(f"at most {db.max_attached() + 1} databases can be opened at once")
+
+# Attaching one file twice would let a copy read and write the same table
+if len({Path(path).resolve() for path in db_paths}) < len(db_paths):
+    parser.error("the same database file was given more than once")
 
 class TableSelector(Widget):
     """A widget that allows the selection of a table from the selected database"""
@@ -43,12 +62,33 @@ class TableSelector(Widget):
         yield Label("Table Selector", id="table-selector-label")
         yield ListView(id="options")
 
-    # On Mount, list all tables files in current working db
+    # On Mount, list all tables in every open db, grouped by database
     def on_mount(self) -> None:
-        table_names = db.get_table_names()
-        for table in table_names:
-            new_listitem = ListItem(Label(table, id="label"))
-            self.query_one("#options").append(new_listitem)
+        options = self.query_one("#options")
+        database_tables = db.get_database_tables()
+
+        # With a single database, list bare table names as before
+        if len(database_tables) == 1:
+            for table in database_tables["main"]:
+                options.append(TableListItem(table))
+            return
+
+        for schema, table_names in database_tables.items():
+            # main is not a file name, so say which file it is
+            heading = schema
+            if schema == "main":
+                heading = f"main ({Path(db.databases['main']).name})"
+            options.append(ListItem(Label(heading, classes="database-label")))
+            for table in table_names:
+                options.append(TableListItem(f"{schema}.{table}", label=f" {table}"))
+
+
+class TableListItem(ListItem):
+    """A table selector entry that remembers the (possibly qualified) table it opens"""
+
+    def __init__(self, table: str, label: Optional[str] = None) -> None:
+        super().__init__(Label(label or table, id="label"))
+        self.table = table
 
 
 # An abstract class for the different methods to fetch data from a table
@@ -301,6 +341,75 @@ class ConfirmDeleteRow(ModalScreen):
             self.app.pop_screen()
 
 
+class CopyRowsModal(ModalScreen):
+    """A screen that allows the user to compare a table with, or copy rows into, a table in another database"""
+
+    def __init__(self, table_viewer: TableViewer, row: Optional[tuple] = None) -> None:
+        super().__init__()
+        self.table_viewer = table_viewer
+        self.row = row
+        self.target_table = None
+
+        # Offer the table of the same name in every other open database
+        schema, name = db.split_table(table_viewer.table)
+        self.targets = [
+            f"{other_schema}.{name}"
+            for other_schema, table_names in db.get_database_tables().items()
+            if other_schema != schema and name in table_names
+        ]
+
+    def compose(self) -> ComposeResult:
+        yield Grid(
+            Label(f"Compare or copy {self.table_viewer.table} with:", id="copy-rows-label"),
+            OptionList(*self.targets, id="copy-rows-options"),
+            Static("", id="copy-rows-result"),
+            Button(f"Compare", id="copy-rows-compare"),
+            Button(f"Copy Row", id="copy-rows-row"),
+            Button(f"Copy Table", id="copy-rows-table"),
+            Button(f"Cancel", id="copy-rows-cancel"),
+            id="copy-rows-grid",
+        )
+
+    def on_mount(self) -> None:
+        if not self.targets:
+            self.query_one("#copy-rows-result").update("No other database has a table with this name.")
+        self.check_buttons()
+
+    def on_option_list_option_highlighted(
+        self, event: OptionList.OptionHighlighted
+    ) -> None:
+        self.target_table = event.option.prompt
+        self.check_buttons()
+
+    def check_buttons(self) -> None:
+        no_target = self.target_table is None
+        self.query_one("#copy-rows-compare").disabled = no_target
+        self.query_one("#copy-rows-row").disabled = no_target or read_only or self.row is None
+        self.query_one("#copy-rows-table").disabled = no_target or read_only
+
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        button_id = event.button.id
+        result = self.query_one("#copy-rows-result")
+        try:
+            if button_id == "copy-rows-compare":
+                only_here, only_there = db.compare_tables(self.table_viewer.table, self.target_table)
+                result.update(
+                    f"{only_here} rows only in {self.table_viewer.table}, "
+                    f"{only_there} rows only in {self.target_table}"
+                )
+            elif button_id == "copy-rows-row":
+                db.copy_rows(self.table_viewer.table, self.target_table, rows=[self.row])
+                result.update(f"Copied 1 row into {self.target_table}")
+            elif button_id == "copy-rows-table":
+                copied = db.copy_rows(self.table_viewer.table, self.target_table)
+                result.update(f"Copied {copied} rows into {self.target_table}")
+            elif button_id == "copy-rows-cancel":
+                self.app.pop_screen()
+        except Exception as error:
+            self.app.pop_screen()
+            self.app.push_screen(ErrorMessageModal(error))
+
+
 class TableSearch(Widget):
     """A widget that allows the searching within a table"""
 
@@ -355,6 +464,7 @@ class PyLiteAdmin(App):
         ("d", "delete_row", "Delete row"),
         ("e", "edit_cell", "Edit cell"),
         ("a", "add_row", "Add row"),
+        ("t", "copy_rows", "Compare/copy"),
         ("ctrl+r", "refresh_table", "Refresh table"),
         ("ctrl+c", "quit", "Quit"),
     ]
@@ -367,6 +477,19 @@ class PyLiteAdmin(App):
         yield Container(id="search-container")
         yield Footer()
 
+    def on_mount(self) -> None:
+        if snapshot:
+            self.sub_title = "snapshot (read-only)"
+        elif read_only:
+            self.sub_title = "read-only"
+
+    def check_editable(self) -> bool:
+        """Returns False and shows an error if the database was opened read-only"""
+        if read_only:
+            self.push_screen(ErrorMessageModal("Database is opened read-only."))
+            return False
+        return True
+
     def change_table(self, table: str, search: Optional[bool] = False) -> None:
         """When a new table is selected, remove the old one and then add new one to the view"""
         if search:
@@ -404,8 +527,10 @@ class PyLiteAdmin(App):
 
     def on_list_view_selected(self, list_item: ListItem) -> None:
         """Change table when a new one is selected from the table selector"""
-        table = list_item.item.query_one("#label").renderable
-        self.change_table(table)
+        # Database headings are not tables
+        if not isinstance(list_item.item, TableListItem):
+            return
+        self.change_table(list_item.item.table)
 
     def action_change_cursor(self) -> None:
         """Change cursor type"""
@@ -413,6 +538,9 @@ class PyLiteAdmin(App):
 
     def action_delete_row(self) -> None:
         """When a row is deleted, remove it from the database and the data table"""
+        if not self.check_editable():
+            return
+
         if self.query_one(DataTable).cursor_type == "column":
             return
 
@@ -430,6 +558,9 @@ class PyLiteAdmin(App):
 
     def action_edit_cell(self) -> None:
         """When a cell is updated, update the database and the data table"""
+        if not self.check_editable():
+            return
+
         table = self.query_one(DataTable)
         table_viewer = self.query_one(TableViewer)
 
@@ -472,6 +603,9 @@ class PyLiteAdmin(App):
 
     def action_add_row(self) -> None:
         """When a row is added, add it to the database and the data table"""
+        if not self.check_editable():
+            return
+
         table = self.query_one(DataTable)
         table_viewer = self.query_one(TableViewer)
 
@@ -479,6 +613,23 @@ class PyLiteAdmin(App):
         # TODO:Callback is to refresh the table, but callback is not currently working. Unknown Cause
         self.app.push_screen(AddRowModal(table_viewer, table), callback=self.action_refresh_table())
 
+    def action_copy_rows(self) -> None:
+        """Compare the current table with, or copy rows into, the same table in another database"""
+        try:
+            table = self.query_one(DataTable)
+            table_viewer = self.query_one(TableViewer)
+        except:
+            return
+
+        # Copy the selected row if the cursor is on one
+        try:
+            row_key, column_key = table.coordinate_to_cell_key(table.cursor_coordinate)
+            row = keys[row_key]
+        except:
+            row = None
+
+        self.app.push_screen(CopyRowsModal(table_viewer, row))
+
     def action_refresh_table(self) -> None:
         """Refresh current table to fetch new rows or go back to whole-table view"""
         try:
@@ -493,7 +644,9 @@ def main():
     app = PyLiteAdmin()
     print("starting...")
     app.run()
+    db.close()
 
 if __name__ == "__main__":
     app = PyLiteAdmin()
-    app.run()
\ No newline at end of file
+    app.run()
+    db.close()
\ No newline at end of file
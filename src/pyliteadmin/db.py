@@ -1,23 +1,132 @@
+import re
 import sqlite3
+from pathlib import Path
+from typing import Optional
+
+# Size of the memory map used for read-only connections (256 MiB)
+MMAP_SIZE = 256 * 1024 * 1024
+
+# Number of rows copied per transaction when copying between databases
+BATCH_SIZE = 500
+
+# The connection shared by every call, with each extra database attached to it
+_conn: Optional[sqlite3.Connection] = None
+
+# Dict of schema names and the database file attached under each of them
+databases: dict[str, str] = {}
+
+def _database_uri(path:str) -> str:
+    """ Returns the URI used to open a database file without taking write locks """
+    from pyliteadmin.app import snapshot
+
+    # immutable=1 also skips locking and change detection entirely, which
+    # is only safe for copied snapshots that nothing else is writing to.
+    uri = f"{Path(path).resolve().as_uri()}?mode=ro"
+    if snapshot:
+        uri += "&immutable=1"
+    return uri
+
+def _is_bare_identifier(name:str) -> bool:
+    """ Returns whether a schema name can be used unquoted, i.e. it is not an SQL keyword """
+    # Qualified table names like shard.users are used unquoted throughout,
+    # so try the name in that position on a throwaway connection
+    probe = sqlite3.connect(":memory:")
+    try:
+        probe.execute(f"ATTACH DATABASE ':memory:' AS \"{name}\"")
+        probe.execute(f"SELECT * FROM {name}.sqlite_master")
+        return True
+    except sqlite3.Error:
+        return False
+    finally:
+        probe.close()
+
+def _schema_name(path:str) -> str:
+    """ Returns an unused schema name for a database file, based on its file name """
+    name = re.sub(r"\W", "_", Path(path).stem) or "db"
+    if name[0].isdigit():
+        name = f"_{name}"
+    if not _is_bare_identifier(name):
+        name = f"{name}_db"
+
+    # Schema names are case-insensitive in sqlite
+    used = {"main", "temp"} | {schema.lower() for schema in databases}
+    schema = name
+    suffix = 2
+    while schema.lower() in used:
+        schema = f"{name}_{suffix}"
+        suffix += 1
+    return schema
+
+def max_attached() -> int:
+    """ Returns how many databases sqlite allows to be attached to one connection """
+    conn = sqlite3.connect(":memory:")
+    try:
+        return conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    except AttributeError:
+        # Connection.getlimit is only available from Python 3.11
+        return 10
+    finally:
+        conn.close()
+
+def connect() -> sqlite3.Connection:
+    """ Returns the shared connection, opening it and attaching every database on first use """
+    global _conn
+    if _conn is not None:
+        return _conn
+
+    # Import the paths to the databases and the launch mode
+    from pyliteadmin.app import db_paths, read_only
+
+    # The first database is main, the rest are attached next to it
+    if read_only:
+        conn = sqlite3.connect(_database_uri(db_paths[0]), uri=True)
+    else:
+        conn = sqlite3.connect(db_paths[0])
+    databases.clear()
+    databases["main"] = db_paths[0]
+
+    for path in db_paths[1:]:
+        schema = _schema_name(path)
+        conn.execute(
+            f"ATTACH DATABASE ? AS \"{schema}\"",
+            (_database_uri(path) if read_only else path,),
+        )
+        databases[schema] = path
+
+    if read_only:
+        conn.execute("PRAGMA query_only = ON")
+        for schema in databases:
+            conn.execute(f"PRAGMA \"{schema}\".mmap_size = {MMAP_SIZE}")
+
+    _conn = conn
+    return _conn
+
+def close() -> None:
+    """ Close the shared connection """
+    global _conn
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+def split_table(table:str) -> tuple[str, str]:
+    """ Returns the schema and the bare table name for a possibly qualified table name """
+    schema, _, name = table.partition(".")
+    if name and schema in databases:
+        return schema, name
+    return "main", table
 
 def get_columns(table:str) -> list:
     """ Returns a list of column names and types for a given table """
-    # Import the path to the database
-    from pyliteadmin.app import db_path
-    
-    conn = sqlite3.connect(db_path)
+    conn = connect()
     cursor = conn.cursor()
-    cursor.execute(f"SELECT * FROM {table}")
+    cursor.execute(f"SELECT * FROM {table} LIMIT 0")
     columns = [description[0] for description in cursor.description]
-    conn.close()
+    cursor.close()
     return columns
 
 def get_table(table:str) -> tuple[list[tuple], list[str]]:
     """ Returns a list of rows as tuples and a list of column names for a given table """
-    # Import the path to the database
-    from pyliteadmin.app import db_path
-
-    conn = sqlite3.connect(db_path)
+    conn = connect()
     cursor = conn.cursor()
     cursor.execute(f"SELECT * FROM {table}")
 
@@ -27,15 +136,12 @@ def get_table(table:str) -> tuple[list[tuple], list[str]]:
     # Get the column names
     columns = get_columns(table)
 
-    conn.close
+    cursor.close()
     return rows, columns
 
 def get_table_page(table:str, offset:int, limit:int) -> tuple[list[tuple], list[str]]:
     """ Returns a list of rows as tuples and a list of column names for a given table """
-    # Import the path to the database
-    from pyliteadmin.app import db_path
-
-    conn = sqlite3.connect(db_path)
+    conn = connect()
     cursor = conn.cursor()
     cursor.execute(f"SELECT * FROM {table} LIMIT {limit} OFFSET {offset}")
 
@@ -45,15 +151,12 @@ def get_table_page(table:str, offset:int, limit:int) -> tuple[list[tuple], list[
     # Get the column names
     columns = get_columns(table)
 
-    conn.close
+    cursor.close()
     return rows, columns
 
 def search_table(table:str, search_column:str, search_value:str) -> list[tuple]:
     """ Returns a list of rows as tuples for a given table and search value and search column """
-    # Import the path to the database
-    from pyliteadmin.app import db_path
-    
-    conn = sqlite3.connect(db_path)
+    conn = connect()
     cursor = conn.cursor()
     cursor.execute(f"SELECT * FROM {table} WHERE {search_column} LIKE '%{search_value}%'")
 
@@ -63,27 +166,21 @@ def search_table(table:str, search_column:str, search_value:str) -> list[tuple]:
     # Get the column names
     columns = get_columns(table)
 
-    conn.close
+    cursor.close()
     return rows, columns
 
-def get_table_names() -> list:
-    """ Returns a list of table names from the current database """
-    # Import the path to the database
-    from pyliteadmin.app import db_path
-
-    conn = sqlite3.connect(db_path)
+def get_table_names(schema:str = "main") -> list:
+    """ Returns a list of table names from the given database """
+    conn = connect()
     cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    cursor.execute(f"SELECT name FROM \"{schema}\".sqlite_master WHERE type='table'")
     table_names = [row[0] for row in cursor.fetchall()]
-    conn.close()
+    cursor.close()
     return sorted(table_names)
 
 def delete_row(table:str, row:tuple, columns:list) -> None:
     """ Delete the currently selected row"""
-    # Import the path to the database
-    from pyliteadmin.app import db_path
-
-    conn = sqlite3.connect(db_path)
+    conn = connect()
     cursor = conn.cursor()
     query = ""
 
@@ -102,19 +199,16 @@ def delete_row(table:str, row:tuple, columns:list) -> None:
         cursor.execute(f"DELETE FROM {table} WHERE {query}")
 
     except Exception as error:
-        conn.close()
+        conn.rollback()
         error_message = f"Error: {error}"
         raise Exception(error_message)
     
     conn.commit()
-    conn.close()
+    cursor.close()
 
 def update_cell(table:str, row: tuple, column:str, columns: list, new_value:str):
     """ Update the selected sell with its new value """
-    # Import the path to the database
-    from pyliteadmin.app import db_path
-
-    conn = sqlite3.connect(db_path)
+    conn = connect()
     cursor = conn.cursor()
     query = ""
     
@@ -132,19 +226,16 @@ def update_cell(table:str, row: tuple, column:str, columns: list, new_value:str)
     try:
         cursor.execute(f"UPDATE {table} SET {column} = '{new_value}' WHERE {query}")
     except Exception as error:
-        conn.close()
+        conn.rollback()
         error_message = f"Error: {error}"
         raise Exception(error_message)
     
     conn.commit()
-    conn.close()
+    cursor.close()
 
 def add_row(table:str, row:tuple) -> None:
     """ Add a new row to the database """
-    # Import the path to the database
-    from pyliteadmin.app import db_path
-
-    conn = sqlite3.connect(db_path)
+    conn = connect()
     cursor = conn.cursor()
     query = ""
 
@@ -162,21 +253,121 @@ def add_row(table:str, row:tuple) -> None:
     try:
         cursor.execute(f"INSERT INTO {table} VALUES ({query})")
     except Exception as error:
-        conn.close()
+        conn.rollback()
         error_message = f"Error: {error}"
         raise Exception(error_message)
     
     conn.commit()
-    conn.close()
+    cursor.close()
 
 def get_row_count(table:str) -> int:
     """ Returns the number of rows in a table """
-    # Import the path to the database
-    from pyliteadmin.app import db_path
-
-    conn = sqlite3.connect(db_path)
+    conn = connect()
     cursor = conn.cursor()
     cursor.execute(f"SELECT COUNT(*) FROM {table}")
     row_count = cursor.fetchone()[0]
-    conn.close()
-    return row_count
\ No newline at end of file
+    cursor.close()
+    return row_count
+
+def get_database_tables() -> dict[str, list[str]]:
+    """ Returns the table names of every open database, keyed by schema name """
+    connect()
+    return {schema: get_table_names(schema) for schema in databases}
+
+def _shared_columns(table:str, other_table:str) -> str:
+    """ Returns the columns of table as a quoted list, checking other_table has all of them """
+    # Shards may declare the same columns in a different order, so rows are
+    # always matched by column name rather than by position
+    columns = get_columns(table)
+    other_columns = {column.lower() for column in get_columns(other_table)}
+    missing = [column for column in columns if column.lower() not in other_columns]
+    if missing:
+        raise Exception(f"{other_table} has no column {', '.join(missing)}")
+    return ", ".join(f'"{column}"' for column in columns)
+
+def compare_tables(table:str, other_table:str) -> tuple[int, int]:
+    """ Returns the number of rows only found in the first table and only found in the second """
+    conn = connect()
+    cursor = conn.cursor()
+
+    try:
+        columns = _shared_columns(table, other_table)
+        cursor.execute(f"SELECT COUNT(*) FROM (SELECT {columns} FROM {table} EXCEPT SELECT {columns} FROM {other_table})")
+        only_in_table = cursor.fetchone()[0]
+        cursor.execute(f"SELECT COUNT(*) FROM (SELECT {columns} FROM {other_table} EXCEPT SELECT {columns} FROM {table})")
+        only_in_other_table = cursor.fetchone()[0]
+    except Exception as error:
+        cursor.close()
+        error_message = f"Error: {error}"
+        raise Exception(error_message)
+
+    cursor.close()
+    return only_in_table, only_in_other_table
+
+def copy_rows(table:str, target_table:str, rows:Optional[list[tuple]] = None, batch_size:int = BATCH_SIZE) -> int:
+    """ Copy the given rows, or every row of table, into target_table and return how many were copied """
+    if split_table(table) == split_table(target_table):
+        raise Exception("Error: Source and target table are the same")
+
+    conn = connect()
+    cursor = conn.cursor()
+    copied = 0
+
+    try:
+        columns = _shared_columns(table, target_table)
+    except Exception as error:
+        cursor.close()
+        error_message = f"Error: {error}"
+        raise Exception(error_message)
+
+    # Page through the source by rowid so each batch is an index seek rather
+    # than a rescan; WITHOUT ROWID tables fall back to LIMIT/OFFSET paging
+    use_rowid = rows is None
+    if use_rowid:
+        try:
+            cursor.execute(f"SELECT rowid FROM {table} LIMIT 0")
+        except sqlite3.Error:
+            use_rowid = False
+    last_rowid = None
+
+    try:
+        while True:
+            # Copy explicit rows in slices, otherwise read the source a page at a time
+            if rows is not None:
+                batch = rows[copied:copied + batch_size]
+            elif use_rowid:
+                # Only the first page is read without a bound, so every
+                # later page can seek straight past the last rowid copied
+                if last_rowid is None:
+                    cursor.execute(f"SELECT rowid, {columns} FROM {table} ORDER BY rowid LIMIT ?", (batch_size,))
+                else:
+                    cursor.execute(
+                        f"SELECT rowid, {columns} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                        (last_rowid, batch_size),
+                    )
+                batch = cursor.fetchall()
+                if batch:
+                    last_rowid = batch[-1][0]
+                    batch = [row[1:] for row in batch]
+            else:
+                cursor.execute(f"SELECT {columns} FROM {table} LIMIT {batch_size} OFFSET {copied}")
+                batch = cursor.fetchall()
+            if not batch:
+                break
+
+            # Each batch is committed in its own transaction so long copies
+            # do not keep the target database locked the whole time
+            placeholders = ", ".join("?" * len(batch[0]))
+            cursor.executemany(f"INSERT INTO {target_table} ({columns}) VALUES ({placeholders})", batch)
+            conn.commit()
+
+            copied += len(batch)
+
+    except Exception as error:
+        conn.rollback()
+        cursor.close()
+        error_message = f"Error: {error} ({copied} rows were already copied into {target_table})"
+        raise Exception(error_message)
+
+    cursor.close()
+    return copied